@@ -1,15 +1,143 @@
 # aggregation.py
 import numpy as np
-import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-def aggregate_portfolio(scenario_dir):
-    files = glob.glob(f"{scenario_dir}/policy_*.csv")
+try:
+    import pandas as pd
+except ImportError:  # pandas is optional; fall back to numpy's text parser
+    pd = None
 
-    portfolio = None
 
-    for f in files:
-        data = np.loadtxt(f, delimiter=",", skiprows=1, usecols=[1, 2])
+POLICY_EXTS = (".csv", ".npy")
+
+
+def extract_numeric_id(name, prefix):
+    """Extract numeric ID from a name with a given prefix."""
+    id_str = os.path.splitext(name.replace(prefix, ""))[0]
+    try:
+        return int(id_str)
+    except ValueError:
+        return float('inf')  # Non-numeric names sort to end
+
+
+def _policy_files(scenario_dir):
+    """
+    Policy result files (.csv or .npy) in `scenario_dir`, ordered by policy id.
+
+    Shared with scripts/aggregate_results.py so both readers see the same files.
+    Raises ValueError if a policy has results in both formats.
+    """
+    if not os.path.isdir(scenario_dir):
+        return []
+    # scandir entries carry name and type, avoiding a stat per file on large directories
+    with os.scandir(scenario_dir) as it:
+        entries = [e for e in it
+                   if e.name.startswith("policy_") and e.name.endswith(POLICY_EXTS) and e.is_file()]
+    # A policy written by runs with different output_format must not be counted twice
+    stems = [os.path.splitext(e.name)[0] for e in entries]
+    if len(set(stems)) != len(stems):
+        dupes = sorted({s for s in stems if stems.count(s) > 1})
+        raise ValueError(f"{scenario_dir} has both .csv and .npy results for {', '.join(dupes[:5])}; "
+                         f"remove one format or use a fresh output_dir")
+    entries.sort(key=lambda e: (extract_numeric_id(e.name, "policy_"), e.name))
+    return [e.path for e in entries]
+
+
+def _read_policy_outputs(path):
+    """Read the PVFP and PVFPrem columns of a policy result file as an (N, 2) float64 array."""
+    if path.endswith(".npy"):
+        return np.load(path)
+    if pd is not None:
+        return pd.read_csv(path, usecols=[1, 2], dtype=np.float64, engine="c",
+                           float_precision="round_trip").to_numpy()
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=[1, 2], ndmin=2)
+
+
+def aggregate_portfolio(scenario_dir, n_sims=None, max_workers=None):
+    """
+    Stack the outputs of every policy result file in `scenario_dir` into one array.
+
+    Files are parsed concurrently on a thread pool and written into their
+    slice of the result in policy id order.
+
+    Args:
+        scenario_dir: Directory containing policy_*.csv or policy_*.npy files
+        n_sims: Rows expected per policy file; read from the first file if omitted
+        max_workers: Parser threads; defaults to os.cpu_count()
+
+    Returns:
+        (len(files) * n_sims, 2) float64 array of PVFP, PVFPrem, or None if no files
+    """
+    files = _policy_files(scenario_dir)
+    if not files:
+        return None
+
+    first = _read_policy_outputs(files[0])
+    if n_sims is None:
+        n_sims = len(first)
 
-        portfolio = np.vstack([portfolio, data]) if portfolio is not None else data
+    portfolio = np.empty((len(files) * n_sims, 2), dtype=np.float64)
+
+    def fill(i, f, data):
+        if len(data) != n_sims:
+            raise ValueError(f"{f} has {len(data)} rows, expected {n_sims}")
+        portfolio[i * n_sims:(i + 1) * n_sims] = data
+
+    fill(0, files[0], first)
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as ex:
+        rest = files[1:]
+        for i, (f, data) in enumerate(zip(rest, ex.map(_read_policy_outputs, rest)), start=1):
+            fill(i, f, data)
 
     return portfolio
+
+
+def aggregate_portfolio_stats(scenario_dir):
+    """
+    Summarize every policy result file in `scenario_dir` without building the portfolio matrix.
+
+    Sums and the ruin count are accumulated file by file; only the two output
+    columns are kept for the medians.
+
+    Returns:
+        Dict with the same keys as aggregate_results.summarize_policy, or None if no rows
+    """
+    files = _policy_files(scenario_dir)
+
+    n = 0
+    ruin = 0
+    sum_pvfp = 0.0
+    sum_pvfprem = 0.0
+    pvfps = []
+    pvfprems = []
+
+    for f in files:
+        # Empty cells and NaN outputs count as 0.0, as in aggregate_results.summarize_policy
+        data = np.nan_to_num(_read_policy_outputs(f), nan=0.0)
+        n += len(data)
+        ruin += int((data[:, 0] < 0).sum())
+        sum_pvfp += float(data[:, 0].sum())
+        sum_pvfprem += float(data[:, 1].sum())
+        pvfps.append(data[:, 0].copy())
+        pvfprems.append(data[:, 1].copy())
+
+    if n == 0:
+        return None
+
+    avg_pvfp = sum_pvfp / n
+    avg_pvfprem = sum_pvfprem / n
+    med_pvfp = float(np.median(np.concatenate(pvfps)))
+    med_pvfprem = float(np.median(np.concatenate(pvfprems)))
+
+    return {
+        "ProbRuin": ruin / n,
+        "AvgPVFP": avg_pvfp,
+        "AvgPVFPrem": avg_pvfprem,
+        "PM_Avg": (avg_pvfp / avg_pvfprem) if avg_pvfprem != 0 else None,
+        "MedianPVFP": med_pvfp,
+        "MedianPVFPrem": med_pvfprem,
+        "PM_Median": (med_pvfp / med_pvfprem) if med_pvfprem != 0 else None,
+        "N": n
+    }
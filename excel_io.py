@@ -2,42 +2,99 @@
 import os
 import csv
 import logging
+import numpy as np
 
 logger = logging.getLogger("stochastic_engine")
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
-def write_policy_csv(path, outputs):
+def _normalize_row(row):
+    """Return (PVFP, PVFPrem) from one Excel output row; missing values become None."""
+    if isinstance(row, (tuple, list)):
+        # Support nested single-row tuples where Excel returns ((x, y),)
+        if len(row) == 1 and isinstance(row[0], (tuple, list)):
+            vals = list(row[0])
+        else:
+            vals = list(row)
+    else:
+        vals = [row]
+
+    pvfp = vals[0] if len(vals) >= 1 else None
+    pvfprem = vals[1] if len(vals) >= 2 else None
+    return pvfp, pvfprem
+
+
+def _outputs_array(outputs):
+    """
+    Normalize `outputs` to an (N, 2) float64 array of PVFP, PVFPrem in one pass.
+
+    Handles the common homogeneous shapes - rows of (x, y) or Excel's nested
+    ((x, y),) - and returns None for anything irregular so callers can fall
+    back to per-row normalization. Missing values (None) become NaN.
+    """
+    try:
+        arr = np.asarray(outputs, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+
+    if arr.ndim == 3 and arr.shape[1] == 1:
+        arr = arr[:, 0, :]
+    if arr.ndim != 2 or arr.shape[1] < 2:
+        return None
+    return arr[:, :2]
+
+
+def write_policy_csv(path, outputs, make_dirs=True):
     """
     Write policy outputs as CSV with columns: sim, PVFP, PVFPrem
 
-    Each item in `outputs` is expected to be either:
+    `outputs` is an (n_sims, 2+) float array, or a sequence whose items are either:
       - a tuple/list with two values (PVFP, PVFPrem), or
       - a single scalar (treated as PVFP, PVFPrem=None)
+
+    Pass make_dirs=False when the parent directory is known to exist.
     """
-    ensure_dir(os.path.dirname(path))
+    if make_dirs:
+        ensure_dir(os.path.dirname(path))
 
-    if not outputs:
+    if len(outputs) == 0:
         raise ValueError("No outputs to write")
 
+    arr = _outputs_array(outputs)
+
     with open(path, "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerow(["sim", "PVFP", "PVFPrem"])
 
-        for i, row in enumerate(outputs, start=1):
-            # Normalize row
-            if isinstance(row, (tuple, list)):
-                # Support nested single-row tuples where Excel returns ((x, y),)
-                if len(row) == 1 and isinstance(row[0], (tuple, list)):
-                    vals = list(row[0])
-                else:
-                    vals = list(row)
-            else:
-                vals = [row]
-
-            # Extract PVFP and PVFPrem
-            pvfp = vals[0] if len(vals) >= 1 else None
-            pvfprem = vals[1] if len(vals) >= 2 else None
+        if arr is not None:
+            # Fast path: one writerows call; tolist() keeps Python float formatting
+            rows = zip(range(1, len(arr) + 1), arr[:, 0].tolist(), arr[:, 1].tolist())
+            if np.isnan(arr).any():
+                # Missing values are written as empty fields, like None
+                rows = ((i, None if a != a else a, None if b != b else b) for i, a, b in rows)
+            writer.writerows(rows)
+            return
 
+        for i, row in enumerate(outputs, start=1):
+            pvfp, pvfprem = _normalize_row(row)
             writer.writerow([i, pvfp, pvfprem])
+
+
+def write_policy_npy(path, outputs, make_dirs=True):
+    """
+    Write policy outputs as a binary (n_sims, 2) float64 .npy array of PVFP, PVFPrem.
+
+    Accepts the same row shapes as write_policy_csv; missing values are stored as NaN.
+    The sim number is implicit in the row index (row 0 is sim 1).
+    """
+    if make_dirs:
+        ensure_dir(os.path.dirname(path))
+
+    if len(outputs) == 0:
+        raise ValueError("No outputs to write")
+
+    arr = _outputs_array(outputs)
+    if arr is None:
+        arr = np.array([_normalize_row(row) for row in outputs], dtype=np.float64)
+    np.save(path, arr)
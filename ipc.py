@@ -0,0 +1,42 @@
+# ipc.py
+import pickle
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; fall back to pickle framing
+    msgpack = None
+
+
+def encode_msg(msg):
+    """Serialize a message dict (str keys, scalar/list values) to bytes."""
+    if msgpack is not None:
+        return msgpack.packb(msg, use_bin_type=True)
+    return pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_msg(data):
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return pickle.loads(data)
+
+
+# A one-byte frame is a progress tick ("one more policy finished"): no payload and
+# nothing to encode. Encoded non-empty message dicts are always longer.
+_TICK = b"\x01"
+
+
+def send_tick(conn):
+    conn.send_bytes(_TICK)
+
+
+def send_msg(conn, msg):
+    """Send one message dict over a multiprocessing Connection."""
+    conn.send_bytes(encode_msg(msg))
+
+
+def recv_msg(conn):
+    """Receive one message dict, or None for a progress tick; raises EOFError if the other end closed."""
+    data = conn.recv_bytes()
+    if len(data) == 1:
+        return None
+    return decode_msg(data)
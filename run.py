@@ -76,6 +76,7 @@ def main():
         provision_enabled = bool(provision_cfg.get("enabled", False))
         provision_force = bool(provision_cfg.get("force", False))
         provision_clean = bool(provision_cfg.get("clean", False))
+        provision_verify = bool(provision_cfg.get("verify", False))
         provision_n_workers = int(provision_cfg.get("n_workers", cfg.get("n_workers")))
 
         # Optionally provision per-worker model copies before starting
@@ -86,6 +87,8 @@ def main():
                 cmd.append("--force")
             if provision_clean:
                 cmd.append("--clean")
+            if provision_verify:
+                cmd.append("--verify")
             logger.info(f"Provisioning worker models with: {' '.join(cmd)}")
             try:
                 proc = subprocess.run(cmd, check=True, capture_output=True, text=True)
@@ -115,6 +118,15 @@ def main():
         rng_assump_addr = cfg.get("rng_assump", "I7:Z7")
         rng_policy_addr = cfg.get("rng_policy", "I3:T3")
         rng_out_addr = cfg.get("rng_out", "U11:V11")
+        rng_out_table_addr = cfg.get("rng_out_table")
+
+        output_format = cfg.get("output_format", "csv")
+        if output_format not in ("csv", "npy"):
+            raise ValueError(f"Invalid output_format: {output_format}. Expected 'csv' or 'npy'.")
+
+        calc_scope = cfg.get("calc_scope", "application")
+        if calc_scope not in ("application", "full", "sheet", "range"):
+            raise ValueError(f"Invalid calc_scope: {calc_scope}. Expected 'application', 'full', 'sheet' or 'range'.")
 
         run_engine(
             model_path = model_path,
@@ -130,11 +142,21 @@ def main():
             rng_assump_addr = rng_assump_addr,
             rng_policy_addr = rng_policy_addr,
             rng_out_addr = rng_out_addr,
+            rng_out_table_addr = rng_out_table_addr,
             queue_timeout = cfg.get("queue_timeout", 10.0),
             worker_timeout = cfg.get("worker_timeout", 300.0),
             max_retries = cfg.get("max_retries", 3),
             retry_delay = cfg.get("retry_delay", 1.0),
             retry_backoff = cfg.get("retry_backoff", 2.0),
+            output_format = output_format,
+            cpu_affinity = bool(cfg.get("cpu_affinity", False)),
+            high_priority = bool(cfg.get("high_priority", False)),
+            max_policies_per_worker = cfg.get("max_policies_per_worker"),
+            policy_batch_size = cfg.get("policy_batch_size"),
+            prefetch_batches = cfg.get("prefetch_batches", 1),
+            calc_scope = calc_scope,
+            batch_macro = cfg.get("batch_macro"),
+            calc_iteration = cfg.get("calc_iteration"),
             logger = logger
         )
         
@@ -1,22 +1,72 @@
 # scheduler.py
 import multiprocessing as mp
+from multiprocessing.connection import wait
 import logging
 import time
 import signal
 import sys
+import heapq
 from collections import deque
-from worker import worker_loop
+from worker import worker_loop, prepare_excel_typelib, available_cpus
+from shared_data import create_shared_table, release_shared_table
+from ipc import send_msg, recv_msg
+from utils import clone_file
 import os
-import shutil
 
-MSG_SET_SCENARIO = "SET_SCENARIO"
-MSG_RUN_POLICY   = "RUN_POLICY"
-MSG_SHUTDOWN     = "SHUTDOWN"
+MSG_SET_SCENARIO     = "SET_SCENARIO"
+MSG_RUN_POLICY_BATCH = "RUN_POLICY_BATCH"
+MSG_SHUTDOWN         = "SHUTDOWN"
 
 logger = logging.getLogger("stochastic_engine")
 
 shutdown_signal = False
 
+# Excel COM workers need a fresh interpreter; set the start method once at import
+if mp.get_start_method(allow_none=True) != "spawn":
+    mp.set_start_method("spawn", force=True)
+
+
+def _partition_jobs(jobs, worker_ids):
+    """
+    Split scenario-major `jobs` into one contiguous deque per worker.
+
+    Contiguous blocks keep each worker on as few scenarios as possible, so
+    SET_SCENARIO fires roughly once per scenario per worker.
+    """
+    queues = {}
+    n = len(worker_ids)
+    start = 0
+    for i, wid in enumerate(worker_ids):
+        end = start + len(jobs) // n + (1 if i < len(jobs) % n else 0)
+        queues[wid] = deque(jobs[start:end])
+        start = end
+    return queues
+
+
+def _pop_batch(queue, batch_size):
+    """Pop up to `batch_size` leading jobs from `queue` that share its first job's scenario."""
+    scen = queue[0][0]
+    batch = []
+    while queue and len(batch) < batch_size and queue[0][0] == scen:
+        batch.append(queue.popleft())
+    return batch
+
+
+def _steal_jobs(queues, thief):
+    """
+    Move the tail half of the longest other queue to `thief`'s queue.
+
+    Taking the tail keeps the victim's next jobs (same scenario) in place and
+    hands the thief a contiguous run. Returns the victim worker id, or None.
+    """
+    victim = max((wid for wid in queues if wid != thief), key=lambda wid: len(queues[wid]), default=None)
+    if victim is None or not queues[victim]:
+        return None
+    n_steal = (len(queues[victim]) + 1) // 2
+    stolen = [queues[victim].pop() for _ in range(n_steal)]
+    queues[thief].extend(reversed(stolen))
+    return victim
+
 
 def run_engine(
     model_path,
@@ -37,6 +87,16 @@ def run_engine(
     max_retries=3,
     retry_delay=1.0,
     retry_backoff=2.0,
+    output_format="csv",
+    cpu_affinity=False,
+    rng_out_table_addr=None,
+    max_policies_per_worker=None,
+    policy_batch_size=None,
+    prefetch_batches=1,
+    calc_scope="application",
+    batch_macro=None,
+    calc_iteration=None,
+    high_priority=False,
     logger=None
 ):
 
@@ -51,184 +111,357 @@ def run_engine(
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    mp.set_start_method("spawn", force=True)
-
-    task_queue   = mp.Queue()
-    result_queue = mp.Queue()
-    
     # Start overall timer
     engine_start = time.time()
 
-    # ---------------- start workers ----------------
-    logger.info(f"Starting {n_workers} worker processes")
+    # ---------------- shared input tables ----------------
+    # Assumptions and policies are immutable for the run: publish them once in
+    # shared memory so task messages carry only IDs.
+    assumptions_shm, assumptions_spec = create_shared_table({scen: assumptions_dict[scen] for scen in scenarios})
+    policies_shm, policies_spec = create_shared_table({pol: policies_dict[pol] for pol in policies})
+    logger.debug(f"Shared tables: assumptions {assumptions_spec['name']} ({assumptions_spec['size']} values), "
+                 f"policies {policies_spec['name']} ({policies_spec['size']} values)")
+
     workers = {}
+    conns = {}      # wid -> scheduler end of the worker's duplex pipe
+    conn_wid = {}   # reverse lookup for connection.wait() results
+    retiring = []   # (wid, process, deadline) of recycled workers still closing Excel
+    try:
+        # ---------------- start workers ----------------
+        logger.info(f"Starting {n_workers} worker processes")
 
-    # Look for pre-provisioned worker models in worker_models_dir
-    os.makedirs(worker_models_dir, exist_ok=True)
-    model_ext = os.path.splitext(model_path)[1]
-    worker_model_paths = {}
-    all_present = True
-    for wid in range(1, n_workers + 1):
-        expected = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
-        if not os.path.exists(expected):
-            all_present = False
-            break
-
-    if not all_present:
-        logger.info(f"Pre-provisioned worker models not complete; creating missing copies in {worker_models_dir}")
-        for wid in range(1, n_workers + 1):
-            dest = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
-            if not os.path.exists(dest):
-                try:
-                    shutil.copy2(model_path, dest)
-                    logger.debug(f"Copied model to {dest} for worker {wid}")
-                except Exception as e:
-                    logger.error(f"Failed to copy model for worker {wid}: {e}. Aborting to avoid using shared master model.")
-                    raise RuntimeError(f"Failed to create worker model copy for worker {wid}: {e}")
-            worker_model_paths[wid] = dest
-    else:
-        logger.info(f"Using existing pre-provisioned worker models in {worker_models_dir}")
+        # Look for pre-provisioned worker models in worker_models_dir
+        os.makedirs(worker_models_dir, exist_ok=True)
+        model_ext = os.path.splitext(model_path)[1]
+        worker_model_paths = {}
+        all_present = True
         for wid in range(1, n_workers + 1):
-            worker_model_paths[wid] = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
-
-    for wid in range(1, n_workers + 1):
-        p = mp.Process(
-            target=worker_loop,
-            args=(
-                wid,
-                task_queue,
-                result_queue,
-                worker_model_paths.get(wid, model_path),
-                output_dir,
-                n_sims,
-                worksheet_name,
-                rng_assump_addr,
-                rng_policy_addr,
-                rng_out_addr,
-                max_retries,
-                retry_delay,
-                retry_backoff
+            expected = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
+            if not os.path.exists(expected):
+                all_present = False
+                break
+
+        if not all_present:
+            logger.info(f"Pre-provisioned worker models not complete; creating missing copies in {worker_models_dir}")
+            for wid in range(1, n_workers + 1):
+                dest = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
+                if not os.path.exists(dest):
+                    try:
+                        clone_file(model_path, dest)
+                        logger.debug(f"Copied model to {dest} for worker {wid}")
+                    except Exception as e:
+                        logger.error(f"Failed to copy model for worker {wid}: {e}. Aborting to avoid using shared master model.")
+                        raise RuntimeError(f"Failed to create worker model copy for worker {wid}: {e}")
+                worker_model_paths[wid] = dest
+        else:
+            logger.info(f"Using existing pre-provisioned worker models in {worker_models_dir}")
+            for wid in range(1, n_workers + 1):
+                worker_model_paths[wid] = os.path.join(worker_models_dir, f"model_worker_{wid}{model_ext}")
+
+        early_binding = prepare_excel_typelib()
+        if early_binding:
+            logger.debug("Excel type library cached for early binding")
+
+        # CPUs this process may run on, for optional per-worker pinning (done by the workers)
+        cpus = available_cpus()
+        # Disjoint block of cores per worker, so Excel's multi-threaded recalculation
+        # still has several cores when there are more cores than workers
+        cores_per_worker = max(1, len(cpus) // n_workers)
+        n_blocks = len(cpus) // cores_per_worker
+
+        def start_worker(wid):
+            # Keep each worker (and its Excel process) on its own cores so they don't migrate
+            cpu_set = None
+            if cpu_affinity:
+                start = ((wid - 1) % n_blocks) * cores_per_worker
+                cpu_set = cpus[start:start + cores_per_worker]
+            parent_conn, child_conn = mp.Pipe()
+            p = mp.Process(
+                target=worker_loop,
+                args=(
+                    wid,
+                    child_conn,
+                    worker_model_paths.get(wid, model_path),
+                    output_dir,
+                    n_sims,
+                    worksheet_name,
+                    rng_assump_addr,
+                    rng_policy_addr,
+                    rng_out_addr,
+                    max_retries,
+                    retry_delay,
+                    retry_backoff,
+                    output_format,
+                    assumptions_spec,
+                    policies_spec,
+                    rng_out_table_addr,
+                    max_policies_per_worker,
+                    calc_scope,
+                    batch_macro,
+                    calc_iteration,
+                    cpu_set,
+                    high_priority,
+                    early_binding
+                )
             )
-        )
-        p.start()
-        workers[wid] = p
-        logger.debug(f"Worker {wid} started (model: {worker_model_paths.get(wid, model_path)})")
-
-    # ---------------- build job queue ----------------
-    jobs = deque()
-    for scen in scenarios:
-        for pol in policies:
-            jobs.append((scen, pol))
-    
-    total_jobs = len(jobs)
-    logger.info(f"Created {total_jobs} jobs ({len(scenarios)} scenarios × {len(policies)} policies)")
-
-    # ---------------- worker state ----------------
-    worker_busy = {wid: False for wid in workers}
-    worker_scenario = {wid: None for wid in workers}
-    worker_last_activity = {wid: time.time() for wid in workers}
-
-    active_jobs = 0
-    completed_jobs = 0
-    job_start_times = {}  # Track when each job started
-
-    # ---------------- main scheduler loop ----------------
-    while (jobs or active_jobs > 0) and not shutdown_signal:
-
-        # ---------- dispatch ----------
-        for wid in workers:
-            if not shutdown_signal and not worker_busy[wid] and jobs:
-                scen, pol = jobs.popleft()
-
-                # change scenario only if needed
-                if worker_scenario[wid] != scen:
-                    task_queue.put({
-                        "type": MSG_SET_SCENARIO,
+            p.start()
+            # Drop our copy of the child end so a dead worker shows up as EOF
+            child_conn.close()
+            workers[wid] = p
+            conns[wid] = parent_conn
+            conn_wid[parent_conn] = wid
+            logger.debug(f"Worker {wid} started (model: {worker_model_paths.get(wid, model_path)})")
+
+        for wid in range(1, n_workers + 1):
+            start_worker(wid)
+
+        # ---------------- build job queues ----------------
+        jobs = [(scen, pol) for scen in scenarios for pol in policies]
+        job_queues = _partition_jobs(jobs, list(workers))
+        pending_jobs = len(jobs)
+
+        total_jobs = len(jobs)
+        # Several policies per RUN_POLICY_BATCH message, small enough that work can still be balanced
+        if policy_batch_size:
+            batch_size = max(1, int(policy_batch_size))
+        else:
+            batch_size = max(1, total_jobs // (4 * n_workers))
+        logger.info(f"Created {total_jobs} jobs ({len(scenarios)} scenarios × {len(policies)} policies), "
+                    f"dispatching up to {batch_size} policies per batch")
+
+        # ---------------- worker state ----------------
+        # Dispatched-but-unfinished batch sizes per worker; the head is the one running.
+        # Up to prefetch_batches more sit in the pipe so a worker never idles waiting
+        # for the scheduler to answer its POLICY_DONE_BATCH.
+        max_in_flight = 1 + max(0, int(prefetch_batches))
+        worker_inflight = {wid: deque() for wid in workers}
+        worker_scenario = {wid: None for wid in workers}
+        worker_last_activity = {wid: time.time() for wid in workers}
+        policies_sent = {wid: 0 for wid in workers}  # since the worker process started
+        worker_busy = {wid: False for wid in workers}    # a batch is running
+        worker_warned = {wid: False for wid in workers}  # approaching-timeout warning sent for it
+        # Each worker's next check time; heap entries that don't match it are superseded
+        worker_wake = {}
+        deadlines = []  # min-heap of (when, wid), about one entry per worker
+        batch_start_times = {}  # Track when each worker's current batch started
+
+        def arm_deadlines(wid, now):
+            # worker_timeout is per policy: workers tick after each policy, so the limit
+            # applies to time since the last progress. Warn at 70%, terminate at 100%.
+            worker_busy[wid] = True
+            worker_warned[wid] = False
+            when = now + worker_timeout * 0.7
+            # An entry left from an earlier batch is reused unless it would check too late
+            if worker_wake.get(wid, float("inf")) > when:
+                worker_wake[wid] = when
+                heapq.heappush(deadlines, (when, wid))
+
+        active_jobs = 0
+        completed_jobs = 0
+
+        # ---------------- main scheduler loop ----------------
+        while (pending_jobs or active_jobs > 0) and not shutdown_signal:
+
+            # ---------- reap retired workers ----------
+            if retiring:
+                now = time.time()
+                still_closing = []
+                for wid, p, deadline in retiring:
+                    p.join(0)
+                    if not p.is_alive():
+                        continue
+                    if now >= deadline:
+                        logger.warning(f"Retired worker {wid} (pid {p.pid}) did not exit, terminating")
+                        p.terminate()
+                        deadline = float("inf")  # reaped on a later pass once the signal lands
+                    still_closing.append((wid, p, deadline))
+                retiring = still_closing
+
+            # ---------- dispatch ----------
+            for wid in workers:
+                while not shutdown_signal and pending_jobs and len(worker_inflight[wid]) < max_in_flight:
+                    if max_policies_per_worker and policies_sent[wid] >= max_policies_per_worker:
+                        break  # the worker retires after its current batches
+                    if not job_queues[wid]:
+                        if worker_inflight[wid]:
+                            break  # only steal for idle workers, not to prefetch
+                        victim = _steal_jobs(job_queues, wid)
+                        logger.debug(f"Worker {wid} stole {len(job_queues[wid])} jobs from worker {victim}")
+                    batch = _pop_batch(job_queues[wid], batch_size)
+                    scen = batch[0][0]
+                    policy_ids = [pol for _, pol in batch]
+                    pending_jobs -= len(batch)
+
+                    # change scenario only if needed
+                    if worker_scenario[wid] != scen:
+                        send_msg(conns[wid], {
+                            "type": MSG_SET_SCENARIO,
+                            "scenario_id": scen
+                        })
+                        worker_scenario[wid] = scen
+                        logger.debug(f"Worker {wid} set to scenario {scen}")
+
+                    send_msg(conns[wid], {
+                        "type": MSG_RUN_POLICY_BATCH,
                         "scenario_id": scen,
-                        "assumptions": assumptions_dict[scen]
+                        "policy_ids": policy_ids
                     })
-                    worker_scenario[wid] = scen
-                    logger.debug(f"Worker {wid} set to scenario {scen}")
-
-                task_queue.put({
-                    "type": MSG_RUN_POLICY,
-                    "scenario_id": scen,
-                    "policy_id": pol,
-                    "policy_data": policies_dict[pol]
-                })
-
-                worker_busy[wid] = True
-                worker_last_activity[wid] = time.time()
-                active_jobs += 1
-                job_key = f"scen_{scen}_pol_{pol}"
-                job_start_times[job_key] = time.time()
-                logger.debug(f"Worker {wid} assigned scenario {scen}, policy {pol}")
-
-        # ---------- collect with timeout ----------
-        try:
-            msg = result_queue.get(timeout=queue_timeout)
-            
-            if msg["event"] == "POLICY_DONE":
-                wid = msg["worker"]
-                worker_busy[wid] = False
-                worker_last_activity[wid] = time.time()
-                active_jobs -= 1
-                completed_jobs += 1
-                job_key = f"scen_{msg['scenario']}_pol_{msg['policy']}"
-                job_elapsed = time.time() - job_start_times.get(job_key, time.time())
-                logger.info(f"Completed {completed_jobs}/{total_jobs}: "
-                           f"Scenario {msg['scenario']}, Policy {msg['policy']} ({job_elapsed:.2f}s)")
-
-            elif msg["event"] == "ERROR":
-                wid = msg["worker"]
-                logger.error(f"Worker {wid} failed: {msg['error']}")
-                raise RuntimeError(f"Worker {wid} failed: {msg['error']}")
-            
-            elif msg["event"] == "SCENARIO_SET":
-                logger.debug(f"Worker {msg['worker']} set scenario {msg['scenario']}")
-        
-        except mp.queues.Empty:
-            # Check for stuck workers
-            current_time = time.time()
-            for wid in workers:
-                if worker_busy[wid]:
+
+                    worker_inflight[wid].append(len(batch))
+                    policies_sent[wid] += len(batch)
+                    active_jobs += len(batch)
+                    if len(worker_inflight[wid]) == 1:
+                        # Worker was idle, so this batch starts now
+                        now = time.time()
+                        worker_last_activity[wid] = now
+                        batch_start_times[wid] = now
+                        arm_deadlines(wid, now)
+                    logger.debug(f"Worker {wid} assigned scenario {scen}, policies {policy_ids}")
+
+            # ---------- wait for the next message or deadline ----------
+            try:
+                # Wakes as soon as any worker reports; otherwise at the earliest deadline
+                wait_timeout = queue_timeout
+                if deadlines:
+                    wait_timeout = min(queue_timeout, max(0.0, deadlines[0][0] - time.time()))
+                if retiring:
+                    wait_timeout = min(wait_timeout, max(0.0, min(d for _, _, d in retiring) - time.time()))
+                ready = wait(list(conns.values()), timeout=wait_timeout)
+
+                # Check for stuck workers: only expired deadlines are inspected
+                current_time = time.time()
+                while deadlines and deadlines[0][0] <= current_time:
+                    when, wid = heapq.heappop(deadlines)
+                    if worker_wake.get(wid) != when:
+                        continue  # superseded by an earlier check
+                    if not worker_busy[wid]:
+                        del worker_wake[wid]  # idle; the next batch arms a fresh check
+                        continue
                     elapsed = current_time - worker_last_activity[wid]
-                    # Warn if approaching timeout (at 70% of timeout)
-                    if elapsed > worker_timeout * 0.7:
-                        logger.warning(f"Worker {wid} approaching timeout: {elapsed:.0f}s / {worker_timeout:.0f}s")
-                    if elapsed > worker_timeout:
+                    if elapsed >= worker_timeout:
                         logger.error(f"Worker {wid} timeout after {elapsed:.0f}s, terminating")
                         workers[wid].terminate()
                         raise RuntimeError(f"Worker {wid} stuck (no response for {elapsed:.0f}s)")
-            
-            # No results available but workers may still be working
-            if active_jobs > 0:
-                logger.debug(f"Waiting for results... ({active_jobs} jobs active, {len(jobs)} pending)")
-                continue
-        
-        except KeyboardInterrupt:
-            shutdown_signal = True
-            logger.warning("Scheduler interrupted")
-
-    # ---------- graceful shutdown ----------
-    if shutdown_signal:
-        logger.warning("Initiating graceful shutdown")
+                    if elapsed >= worker_timeout * 0.7 and not worker_warned[wid]:
+                        logger.warning(f"Worker {wid} approaching timeout: {elapsed:.0f}s / {worker_timeout:.0f}s")
+                        worker_warned[wid] = True
+                    # Progress ticks push the check out lazily: next look is once the worker
+                    # has been quiet for the rest of its allowance
+                    limit = worker_timeout if worker_warned[wid] else worker_timeout * 0.7
+                    worker_wake[wid] = worker_last_activity[wid] + limit
+                    heapq.heappush(deadlines, (worker_wake[wid], wid))
+
+                if not ready:
+                    # No results available but workers may still be working
+                    if active_jobs > 0:
+                        logger.debug(f"Waiting for results... ({active_jobs} jobs active, {pending_jobs} pending)")
+                    continue
+
+                for conn in ready:
+                    try:
+                        msg = recv_msg(conn)
+                    except EOFError:
+                        wid = conn_wid[conn]
+                        logger.error(f"Worker {wid} exited unexpectedly")
+                        raise RuntimeError(f"Worker {wid} exited unexpectedly")
+
+                    if msg is None:
+                        # Progress tick: the worker finished another policy of its current batch
+                        worker_last_activity[conn_wid[conn]] = time.time()
+                        continue
+
+                    if msg["event"] == "POLICY_DONE_BATCH":
+                        wid = msg["worker"]
+                        done = msg["policies"]
+                        now = time.time()
+                        worker_inflight[wid].popleft()
+                        worker_last_activity[wid] = now
+                        active_jobs -= len(done)
+                        completed_jobs += len(done)
+                        batch_elapsed = now - batch_start_times.pop(wid, now)
+                        if worker_inflight[wid]:
+                            # The prefetched batch is already running
+                            batch_start_times[wid] = now
+                            arm_deadlines(wid, now)
+                        else:
+                            worker_busy[wid] = False
+                        logger.info(f"Completed {completed_jobs}/{total_jobs}: "
+                                   f"Scenario {msg['scenario']}, Policies {done[0]}..{done[-1]} "
+                                   f"({len(done)} in {batch_elapsed:.2f}s)")
+
+                        if msg.get("retire"):
+                            # Worker hit max_policies_per_worker: start a fresh one in the same
+                            # slot (same model copy, opened read-only) while the old one closes Excel
+                            del conn_wid[conns[wid]]
+                            conns.pop(wid).close()
+                            retiring.append((wid, workers.pop(wid), now + 30.0))
+                            worker_scenario[wid] = None
+                            policies_sent[wid] = 0
+                            if pending_jobs:
+                                start_worker(wid)
+                                logger.info(f"Worker {wid} recycled")
+
+                    elif msg["event"] == "ERROR":
+                        wid = msg["worker"]
+                        logger.error(f"Worker {wid} failed: {msg['error']}")
+                        raise RuntimeError(f"Worker {wid} failed: {msg['error']}")
+
+            except KeyboardInterrupt:
+                shutdown_signal = True
+                logger.warning("Scheduler interrupted")
+
+        # ---------- graceful shutdown ----------
+        if shutdown_signal:
+            logger.warning("Initiating graceful shutdown")
     
-    logger.info(f"Sending shutdown signals to {len(workers)} workers")
-    for _ in workers:
-        task_queue.put({"type": MSG_SHUTDOWN})
-
-    # Wait for workers with timeout
-    for wid, p in workers.items():
-        p.join(timeout=10.0)
-        if p.is_alive():
-            logger.warning(f"Worker {wid} did not exit, terminating")
-            p.terminate()
-            p.join(timeout=2.0)
+        logger.info(f"Sending shutdown signals to {len(workers)} workers")
+        for wid, conn in conns.items():
+            try:
+                send_msg(conn, {"type": MSG_SHUTDOWN})
+            except (BrokenPipeError, OSError) as e:
+                logger.debug(f"Worker {wid} pipe already closed: {e}")
+
+        # Wait for workers with timeout
+        for wid, p in workers.items():
+            p.join(timeout=10.0)
+            if p.is_alive():
+                logger.warning(f"Worker {wid} did not exit, terminating")
+                p.terminate()
+                p.join(timeout=2.0)
+            conns[wid].close()
+        for wid, p, deadline in retiring:
+            p.join(timeout=max(0.0, min(deadline, time.time() + 10.0) - time.time()))
+            if p.is_alive():
+                logger.warning(f"Retired worker {wid} did not exit, terminating")
+                p.terminate()
+                p.join(timeout=2.0)
+        retiring = []
     
-    # Report final timing
-    engine_elapsed = time.time() - engine_start
-    avg_job_time = engine_elapsed / total_jobs if total_jobs > 0 else 0
-    logger.info(f"Engine shutdown complete. Completed {completed_jobs}/{total_jobs} jobs")
-    logger.info(f"Total engine time: {engine_elapsed:.2f}s ({engine_elapsed/60:.2f}m)")
-    logger.info(f"Average time per job: {avg_job_time:.2f}s")
+        # Report final timing
+        engine_elapsed = time.time() - engine_start
+        avg_job_time = engine_elapsed / total_jobs if total_jobs > 0 else 0
+        logger.info(f"Engine shutdown complete. Completed {completed_jobs}/{total_jobs} jobs")
+        logger.info(f"Total engine time: {engine_elapsed:.2f}s ({engine_elapsed/60:.2f}m)")
+        logger.info(f"Average time per job: {avg_job_time:.2f}s")
+
+    finally:
+        # After an error workers may still be attached to the shared tables: stop them
+        # before unlinking, or they die on missing segments and the parent hangs at exit
+        alive = {wid: p for wid, p in workers.items() if p.is_alive()}
+        for wid in alive:
+            try:
+                send_msg(conns[wid], {"type": MSG_SHUTDOWN})
+            except (BrokenPipeError, OSError):
+                pass
+        alive = list(alive.items()) + [(wid, p) for wid, p, _ in retiring if p.is_alive()]
+        grace_end = time.time() + 5.0
+        for wid, p in alive:
+            p.join(timeout=max(0.0, grace_end - time.time()))
+            if p.is_alive():
+                logger.warning(f"Worker {wid} still running after error, terminating")
+                p.terminate()
+                p.join(timeout=2.0)
+        for conn in conns.values():
+            conn.close()
+        release_shared_table(assumptions_shm, unlink=True)
+        release_shared_table(policies_shm, unlink=True)
@@ -1,47 +1,104 @@
 #!/usr/bin/env python3
-"""Aggregate simulation CSV outputs into a summary CSV.
+"""Aggregate simulation outputs into a summary CSV.
 
 Outputs expected: folder structure under OUTPUT_DIR like:
-  OUTPUT_DIR/scenario_{scen}/policy_{pol}.csv
+  OUTPUT_DIR/scenario_{scen}/policy_{pol}.csv   (output_format: csv)
+  OUTPUT_DIR/scenario_{scen}/policy_{pol}.npy   (output_format: npy)
 
 Each policy CSV must have header: sim,PVFP,PVFPrem
+Each policy .npy file holds an (n_sims, 2) float64 array of PVFP, PVFPrem
 
 Produces a summary CSV with columns:
   Scenario,Policy,ProbRuin,AvgPVFP,AvgPVFPrem,PM_Avg,MedianPVFP,MedianPVFPrem,PM_Median
 """
 import argparse
 import csv
+import math
 import os
-from statistics import mean, median
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
 
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:  # pandas is optional; fall back to the csv module
+    pd = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregation import _policy_files, extract_numeric_id
+
+OUTPUT_COLUMNS = {"PVFP", "out1", "PVFPrem", "out2"}
+
+
+def _read_npy(path):
+    arr = np.load(path)
+    # Missing values are stored as NaN; treat them as 0.0 like empty CSV cells
+    arr = np.nan_to_num(arr, nan=0.0)
+    return arr[:, 0], arr[:, 1]
+
+
+def _read_csv(path):
+    if pd is not None:
+        df = pd.read_csv(path, usecols=lambda c: c in OUTPUT_COLUMNS, dtype=np.float64, engine="c",
+                         float_precision="round_trip")
+
+        def column(name, alt):
+            # Empty cells in `name` fall back to `alt`, then to 0.0
+            col = df[name] if name in df else pd.Series(np.nan, index=df.index)
+            if alt in df:
+                col = col.fillna(df[alt])
+            return col.fillna(0.0).to_numpy()
+
+        return column("PVFP", "out1"), column("PVFPrem", "out2")
 
-def summarize_policy(path):
     pvfps = []
     pvf_prems = []
     with open(path, newline="") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            try:
-                pvfp = float(row.get("PVFP") or row.get("out1") or 0.0)
-            except Exception:
-                pvfp = float(row.get("PVFP") or row.get("out1") or 0.0)
-            try:
-                pvfprem = float(row.get("PVFPrem") or row.get("out2") or 0.0)
-            except Exception:
-                pvfprem = float(row.get("PVFPrem") or row.get("out2") or 0.0)
-            pvfps.append(pvfp)
-            pvf_prems.append(pvfprem)
-
-    if not pvfps:
-        return None
+            pvfps.append(float(row.get("PVFP") or row.get("out1") or 0.0))
+            pvf_prems.append(float(row.get("PVFPrem") or row.get("out2") or 0.0))
+    return np.asarray(pvfps, dtype=np.float64), np.asarray(pvf_prems, dtype=np.float64)
+
+
+def _mean(values):
+    """
+    Mean of `values` rounded once from their exact sum, like statistics.mean.
+
+    A float64 mean can differ in the last digit, which shows up in the summary CSV.
+    Each fsum picks up the correctly rounded remainder of the exact sum, usually once.
+    """
+    total = Fraction(0)
+    rest = values
+    while True:
+        partial = math.fsum(rest)
+        if not math.isfinite(partial):
+            return partial
+        if partial == 0:
+            return float(total / len(values))
+        total += Fraction(partial)
+        rest = np.append(rest, -partial)
+
+
+def summarize_policy(path):
+    if path.endswith(".npy"):
+        pvfps, pvf_prems = _read_npy(path)
+    else:
+        pvfps, pvf_prems = _read_csv(path)
 
     n = len(pvfps)
-    prob_ruin = sum(1 for v in pvfps if v < 0) / n
-    avg_pvfp = mean(pvfps)
-    avg_pvfprem = mean(pvf_prems) if pvf_prems else 0.0
+    if n == 0:
+        return None
+
+    prob_ruin = float(np.count_nonzero(pvfps < 0)) / n
+    avg_pvfp = _mean(pvfps)
+    avg_pvfprem = _mean(pvf_prems)
     pm_avg = (avg_pvfp / avg_pvfprem) if avg_pvfprem != 0 else None
-    med_pvfp = median(pvfps)
-    med_pvfprem = median(pvf_prems) if pvf_prems else 0.0
+    # np.median selects with np.partition (O(N)) rather than a full sort
+    med_pvfp = float(np.median(pvfps))
+    med_pvfprem = float(np.median(pvf_prems))
     pm_med = (med_pvfp / med_pvfprem) if med_pvfprem != 0 else None
 
     return {
@@ -56,19 +113,24 @@ def summarize_policy(path):
     }
 
 
-def extract_numeric_id(name, prefix):
-    """Extract numeric ID from a name with a given prefix."""
-    id_str = name.replace(prefix, "").replace(".csv", "")
-    try:
-        return int(id_str)
-    except ValueError:
-        return float('inf')  # Non-numeric names sort to end
+def _summarize_wrapper(task):
+    """Summarize one (scen_id, pol_id, fpath) task into a summary row, or None."""
+    scen_id, pol_id, fpath = task
+    stats = summarize_policy(fpath)
+    if stats is None:
+        return None
+    return {
+        "Scenario": scen_id,
+        "Policy": pol_id,
+        **stats
+    }
 
 
 def main():
-    p = argparse.ArgumentParser(description="Aggregate policy CSV results")
+    p = argparse.ArgumentParser(description="Aggregate policy CSV / .npy results")
     p.add_argument("--output-dir", required=True, help="Output directory where scenario folders live")
     p.add_argument("--out-file", default=None, help="Summary CSV filename (relative to output-dir). Defaults to <output-subdir>_summary.csv")
+    p.add_argument("--jobs", type=int, default=None, help="Worker processes for summarizing files (default: CPU count; 1 runs serially)")
     args = p.parse_args()
 
     out_dir = args.output_dir
@@ -79,32 +141,32 @@ def main():
         summary_name = f"{base}_summary.csv"
     summary_path = os.path.join(out_dir, summary_name)
 
-    rows = []
+    tasks = []
     # Sort scenarios numerically
-    scenario_dirs = [d for d in os.listdir(out_dir) if os.path.isdir(os.path.join(out_dir, d)) and d.startswith("scenario_")]
+    scenario_dirs = [e.name for e in os.scandir(out_dir) if e.name.startswith("scenario_") and e.is_dir()]
     scenario_dirs.sort(key=lambda x: extract_numeric_id(x, "scenario_"))
     
     for scen_name in scenario_dirs:
         scen_path = os.path.join(out_dir, scen_name)
         # Expect scen_name like scenario_1
         scen_id = scen_name.replace("scenario_", "")
-        # Sort policy files numerically
-        policy_files = [f for f in os.listdir(scen_path) if f.startswith("policy_") and f.endswith(".csv")]
-        policy_files.sort(key=lambda x: extract_numeric_id(x, "policy_"))
-        
-        for fname in policy_files:
-            if not fname.startswith("policy_") or not fname.endswith(".csv"):
-                continue
-            pol_id = fname.replace("policy_", "").replace(".csv", "")
-            fpath = os.path.join(scen_path, fname)
-            stats = summarize_policy(fpath)
-            if stats is None:
-                continue
-            rows.append({
-                "Scenario": scen_id,
-                "Policy": pol_id,
-                **stats
-            })
+        # Policy files in numeric order, listed the same way as aggregation.py
+        try:
+            policy_files = _policy_files(scen_path)
+        except ValueError as e:
+            raise SystemExit(str(e))
+
+        for fpath in policy_files:
+            pol_id = os.path.splitext(os.path.basename(fpath).replace("policy_", ""))[0]
+            tasks.append((scen_id, pol_id, fpath))
+
+    # Files are independent: summarize them in parallel, keeping task order
+    if args.jobs == 1:
+        results = map(_summarize_wrapper, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            results = list(ex.map(_summarize_wrapper, tasks, chunksize=8))
+    rows = [r for r in results if r is not None]
 
     # Write summary CSV
     if rows:
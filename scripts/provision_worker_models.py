@@ -2,20 +2,28 @@
 """Provision per-worker copies of an Excel model.
 
 Usage:
-  python scripts/provision_worker_models.py --model models/my.xlsb --out worker_models --n-workers 6 [--force]
+  python scripts/provision_worker_models.py --model models/my.xlsb --out worker_models --n-workers 6 [--force] [--verify]
 
 This script is idempotent: it will skip copying if destination exists unless --force is set.
 """
 import argparse
 import os
+import time
 import shutil
 import sys
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import clone_file
 
-def sha256(path, chunk_size=8192):
-    h = hashlib.sha256()
+
+def sha256(path, chunk_size=1024 * 1024):
     with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+: C-level read loop with large buffers
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         while True:
             chunk = f.read(chunk_size)
             if not chunk:
@@ -24,7 +32,7 @@ def sha256(path, chunk_size=8192):
     return h.hexdigest()
 
 
-def provision(model, out_dir, n_workers, force=False, clean=False):
+def provision(model, out_dir, n_workers, force=False, clean=False, verify=False):
     # If clean is requested, remove out_dir entirely first (clean slate)
     if clean and os.path.exists(out_dir):
         try:
@@ -34,30 +42,52 @@ def provision(model, out_dir, n_workers, force=False, clean=False):
             return 1
     os.makedirs(out_dir, exist_ok=True)
     ext = os.path.splitext(model)[1]
-    results = []
-    for wid in range(1, n_workers + 1):
+
+    def _copy_one(wid):
         dest = os.path.join(out_dir, f"model_worker_{wid}{ext}")
         if os.path.exists(dest) and not force:
-            results.append((wid, dest, False))
-            continue
+            return (wid, dest, False)
+        clone_file(model, dest)
+        return (wid, dest, True)
+
+    # Copies go to independent destinations, so run them concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(n_workers, 8))) as ex:
+        futures = [(wid, ex.submit(_copy_one, wid)) for wid in range(1, n_workers + 1)]
+    results = []
+    for wid, fut in futures:
         try:
-            shutil.copy2(model, dest)
-            results.append((wid, dest, True))
+            results.append(fut.result())
         except Exception as e:
             print(f"Failed to copy for worker {wid}: {e}")
             return 1
 
-    # Print summary with checksums
+    if not verify:
+        print("Provisioning complete")
+        for wid, dest, copied in results:
+            status = "created" if copied else "exists"
+            try:
+                st = os.stat(dest)
+                info = f"size={st.st_size} mtime={time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(st.st_mtime))}"
+            except OSError:
+                info = "size=?"
+            print(f"Worker {wid}: {dest} ({status}) {info}")
+        return 0
+
+    # Verify every copy against the source checksum, hashing copies concurrently
+    src_hash = sha256(model)
+    with ThreadPoolExecutor(max_workers=max(1, min(n_workers, 8))) as ex:
+        hashes = list(ex.map(lambda r: sha256(r[1]), results))
+
     print("Provisioning complete")
-    for wid, dest, copied in results:
+    rc = 0
+    for (wid, dest, copied), h in zip(results, hashes):
         status = "created" if copied else "exists"
-        try:
-            h = sha256(dest)
-        except Exception:
-            h = "?"
         print(f"Worker {wid}: {dest} ({status}) sha256={h}")
+        if h != src_hash:
+            print(f"Checksum mismatch for worker {wid}: expected {src_hash}")
+            rc = 1
 
-    return 0
+    return rc
 
 
 def main():
@@ -67,9 +97,10 @@ def main():
     p.add_argument("--n-workers", type=int, required=True, help="Number of worker copies to create")
     p.add_argument("--force", action="store_true", help="Recreate copies even if present")
     p.add_argument("--clean", action="store_true", help="Remove out directory first (clean slate)")
+    p.add_argument("--verify", action="store_true", help="Check each copy's sha256 against the source model")
     args = p.parse_args()
 
-    rc = provision(args.model, args.out, args.n_workers, force=args.force, clean=args.clean)
+    rc = provision(args.model, args.out, args.n_workers, force=args.force, clean=args.clean, verify=args.verify)
     sys.exit(rc)
 
 
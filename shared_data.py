@@ -0,0 +1,61 @@
+# shared_data.py
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def create_shared_table(table):
+    """
+    Pack an {id: values} table into one shared float64 block.
+
+    Args:
+        table: Dict mapping integer ID to a 1-D sequence of floats
+
+    Returns:
+        (shm, spec) where `shm` is the owning SharedMemory and `spec` is a small
+        picklable dict ({"name", "size", "index"}) that workers pass to
+        attach_shared_table. `index` maps each ID to its (offset, length).
+    """
+    index = {}
+    offset = 0
+    for key, values in table.items():
+        index[key] = (offset, len(values))
+        offset += len(values)
+
+    # SharedMemory rejects size 0, so always allocate at least one element
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1) * np.dtype(np.float64).itemsize)
+    flat = np.ndarray((offset,), dtype=np.float64, buffer=shm.buf)
+    for key, (off, length) in index.items():
+        flat[off:off + length] = table[key]
+    del flat
+
+    return shm, {"name": shm.name, "size": offset, "index": index}
+
+
+def attach_shared_table(spec):
+    """
+    Attach to a table created by create_shared_table.
+
+    Returns:
+        (shm, flat) where `flat` is a zero-copy float64 view of the whole block
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=spec["name"], track=False)
+    except TypeError:  # track= is Python 3.13+
+        shm = shared_memory.SharedMemory(name=spec["name"])
+    flat = np.ndarray((spec["size"],), dtype=np.float64, buffer=shm.buf)
+    return shm, flat
+
+
+def table_row(flat, spec, key):
+    """Zero-copy view of the values for `key`."""
+    off, length = spec["index"][key]
+    return flat[off:off + length]
+
+
+def release_shared_table(shm, unlink=False):
+    """Close (and optionally unlink) a shared table; views into it must be dropped first."""
+    try:
+        shm.close()
+    finally:
+        if unlink:
+            shm.unlink()
@@ -1,7 +1,88 @@
 # utils.py
 import csv
+import shutil
+import subprocess
+import sys
+import numpy as np
+
+
+def _import_pandas():
+    """
+    pandas, or None if it isn't installed.
+
+    Imported on first use rather than at module level: spawned workers re-import
+    the main script (and so this module) but never read CSVs, and pandas adds
+    a noticeable share of each worker's startup time.
+    """
+    try:
+        import pandas as pd
+    except ImportError:  # pandas is optional; fall back to the csv module
+        return None
+    return pd
+
+
+# None until the first clone attempt; False once cloning has failed (don't retry)
+_clone_supported = None
+
+
+def _clone_command():
+    """cp invocation that makes a copy-on-write clone on this platform, or None."""
+    if sys.platform.startswith("linux"):
+        # btrfs/xfs reflink; cp itself falls back to a regular copy elsewhere
+        return ["cp", "--reflink=auto", "--preserve=mode,timestamps"]
+    if sys.platform == "darwin":
+        # APFS clonefile
+        return ["cp", "-c", "-p"]
+    return None
+
+
+def clone_file(src, dest):
+    """
+    Copy `src` to `dest`, as a copy-on-write clone where the filesystem supports it.
+
+    Clones are O(1) and share blocks until a copy is modified, so per-worker
+    model copies cost almost no disk I/O. Falls back to shutil.copy2.
+    """
+    global _clone_supported
+    cmd = _clone_command()
+    if cmd is not None and _clone_supported is not False:
+        try:
+            subprocess.run(cmd + [src, dest], check=True, capture_output=True)
+            _clone_supported = True
+            return
+        except (OSError, subprocess.CalledProcessError):
+            _clone_supported = False
+    shutil.copy2(src, dest)
+
 
 def load_csv_dict(path):
+    """
+    Load a CSV keyed by its first column.
+
+    Returns:
+        Dict mapping integer ID (first column) to a 1-D float64 ndarray of the remaining columns
+    """
+    pd = _import_pandas()
+    if pd is not None:
+        columns = pd.read_csv(path, header=0, nrows=0).columns
+        # IDs are parsed as integers so "1.5" or IDs above 2**53 can't collapse onto another ID.
+        # round_trip parses values exactly like float(); the default "high" parser can be 1 ULP off
+        dtypes = {col: np.float64 for col in columns[1:]}
+        dtypes[columns[0]] = np.int64
+        try:
+            df = pd.read_csv(path, header=0, dtype=dtypes, engine="c", float_precision="round_trip")
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from e
+        missing = df.isna()
+        if missing.any().any():
+            # Empty cells would otherwise be written into the model as NaN
+            row, col = next(zip(*np.nonzero(missing.to_numpy())))
+            raise ValueError(f"{path}: missing value on line {row + 2}, column '{df.columns[col]}'")
+        ids = df.iloc[:, 0]
+        if ids.duplicated().any():
+            raise ValueError(f"{path}: duplicate ID {ids[ids.duplicated()].iloc[0]}")
+        return dict(zip(ids.tolist(), df.iloc[:, 1:].to_numpy()))
+
     data = {}
     with open(path) as f:
         reader = csv.reader(f)
@@ -9,7 +90,9 @@ def load_csv_dict(path):
 
         for row in reader:
             key = int(row[0])
-            values = [float(x) for x in row[1:]]
+            if key in data:
+                raise ValueError(f"{path}: duplicate ID {key}")
+            values = np.asarray([float(x) for x in row[1:]], dtype=np.float64)
             data[key] = values
 
     return data
@@ -34,44 +117,49 @@ def expand_config_list(config_value, available_keys):
     Returns:
         Sorted list of integer IDs
     """
+    # Build the lookup set and sorted key list once; reused by ranges, "all" and error messages
+    avail_set = set(available_keys)
+    avail_sorted = sorted(avail_set)
+
     if isinstance(config_value, str):
         if config_value.lower() == "all":
-            return sorted(list(available_keys))
+            return list(avail_sorted)
         else:
             # Single range like "5:10" or "5-10"
-            return _parse_range(config_value, available_keys)
+            return _parse_range(config_value, avail_set, avail_sorted)
     
     elif isinstance(config_value, list):
         # Handle special case of ["all"]
         if len(config_value) == 1 and isinstance(config_value[0], str) and config_value[0].lower() == "all":
-            return sorted(list(available_keys))
+            return list(avail_sorted)
         
-        result = []
+        result = set()
         for item in config_value:
             if isinstance(item, int):
-                if item in available_keys:
-                    result.append(item)
+                if item in avail_set:
+                    result.add(item)
                 else:
-                    raise ValueError(f"ID {item} not found in available keys: {sorted(available_keys)}")
+                    raise ValueError(f"ID {item} not found in available keys: {avail_sorted}")
             elif isinstance(item, str):
                 if item.lower() == "all":
-                    result.extend(sorted(list(available_keys)))
+                    result.update(avail_set)
                 else:
                     # Range within list
-                    result.extend(_parse_range(item, available_keys))
-        return sorted(list(set(result)))  # Remove duplicates and sort
+                    result.update(_parse_range(item, avail_set, avail_sorted))
+        return sorted(result)  # Remove duplicates and sort
     
     else:
         raise ValueError(f"Invalid config format: {config_value}. Expected string or list.")
 
 
-def _parse_range(range_str, available_keys):
+def _parse_range(range_str, available_keys, sorted_keys=None):
     """
     Parse range string like "5:10" or "5-10" (inclusive).
     
     Args:
         range_str: String like "5:10" or "5-10"
         available_keys: Set or list of available IDs
+        sorted_keys: Optional pre-sorted available IDs, used in error messages
     
     Returns:
         List of integer IDs in range that exist in available_keys
@@ -96,10 +184,16 @@ def _parse_range(range_str, available_keys):
     if start > end:
         raise ValueError(f"Invalid range: start {start} > end {end}")
     
-    # Return only IDs that exist in available_keys
-    result = [i for i in range(start, end + 1) if i in available_keys]
+    # Return only IDs that exist in available_keys, iterating whichever side is smaller
+    avail = available_keys if isinstance(available_keys, (set, frozenset)) else set(available_keys)
+    if end - start + 1 <= len(avail):
+        result = [i for i in range(start, end + 1) if i in avail]
+    else:
+        result = sorted(k for k in avail if start <= k <= end)
     
     if not result:
-        raise ValueError(f"Range {range_str} doesn't match any available IDs. Available: {sorted(available_keys)}")
+        if sorted_keys is None:
+            sorted_keys = sorted(avail)
+        raise ValueError(f"Range {range_str} doesn't match any available IDs. Available: {sorted_keys}")
     
     return result
@@ -1,68 +1,329 @@
 # worker.py
+import multiprocessing as mp
+import os
+import sys
 import traceback
+
+# pythoncom initializes COM for the importing thread. Ask for the multithreaded
+# apartment so calls into the out-of-process Excel server don't run a message
+# loop while they wait; worker_loop falls back to STA if it's refused.
+# Only in spawned workers: the parent imports this module via scheduler and is
+# deliberately left in its default apartment. parent_process() is still None
+# while a spawned child re-imports the main script, so check the name as well.
+_in_worker = mp.parent_process() is not None or mp.current_process().name != "MainProcess"
+if _in_worker and not hasattr(sys, "coinit_flags"):
+    sys.coinit_flags = 0  # COINIT_MULTITHREADED
 import pythoncom
+import win32api
+import win32con
+import win32process
 import win32com.client
 import time
 import logging
-from excel_io import write_policy_csv
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from excel_io import ensure_dir, write_policy_csv, write_policy_npy
+from shared_data import attach_shared_table, table_row, release_shared_table
+from ipc import send_msg, send_tick, recv_msg
 
 logger = logging.getLogger("stochastic_engine")
 
+# Microsoft Excel Object Library. Its version differs between Excel releases (1.8 for
+# 2013, 1.9 for 2016 and later), so prepare_excel_typelib looks up the installed one
+EXCEL_TYPELIB_CLSID = "{00020813-0000-0000-C000-000000000046}"
+
+
+def prepare_excel_typelib():
+    """
+    Generate the makepy (early-binding) module for Excel once, in the parent.
+
+    Workers then wrap their Excel instance with cached DISPIDs instead of
+    resolving names on every property access, without racing each other to
+    write the gen_py cache. Returns False if the type library isn't available;
+    workers fall back to late binding.
+    """
+    try:
+        # Asking for 1.0 loads the highest registered 1.x library; generate for exactly that
+        # version so workers' EnsureDispatch finds it in the cache instead of building it
+        attr = pythoncom.LoadRegTypeLib(EXCEL_TYPELIB_CLSID, 1, 0, 0).GetLibAttr()
+        _, lcid, _, major, minor = attr[:5]
+        win32com.client.gencache.EnsureModule(EXCEL_TYPELIB_CLSID, lcid, major, minor, bForDemand=False)
+        return True
+    except Exception as e:
+        logger.debug(f"Excel type library not cached, workers will use late binding: {e}")
+        return False
+
+
+def available_cpus():
+    """
+    CPUs the current process may run on, honouring its own affinity.
+
+    On Windows this is limited to the process's processor group (at most 64
+    logical CPUs), the only ones an affinity mask can address.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    process_mask, _ = win32process.GetProcessAffinityMask(win32api.GetCurrentProcess())
+    return [cpu for cpu in range(64) if process_mask >> cpu & 1]
+
+
+def _tune_process(pid, cpu_set=None, high_priority=False):
+    """Pin process `pid` to the CPUs in `cpu_set` and/or raise it to HIGH_PRIORITY_CLASS."""
+    if cpu_set is not None and max(cpu_set) >= 64:
+        raise ValueError(f"CPUs {list(cpu_set)} are outside the 64-CPU processor group an affinity mask covers")
+    handle = win32api.OpenProcess(win32con.PROCESS_SET_INFORMATION | win32con.PROCESS_QUERY_INFORMATION, False, pid)
+    try:
+        if cpu_set is not None:
+            win32process.SetProcessAffinityMask(handle, sum(1 << cpu for cpu in cpu_set))
+        if high_priority:
+            win32process.SetPriorityClass(handle, win32process.HIGH_PRIORITY_CLASS)
+    finally:
+        win32api.CloseHandle(handle)
+
 
-def worker_loop(worker_id, task_queue, result_queue,
+def _range_shape(rng):
+    return rng.Rows.Count, rng.Columns.Count
+
+
+def _check_table_shape(spec, shape, what, addr):
+    """Fail fast if any table row doesn't exactly fill its target range."""
+    size = shape[0] * shape[1]
+    bad = [key for key, (_, length) in spec["index"].items() if length != size]
+    if bad:
+        raise ValueError(f"{what} {bad[:5]} have {spec['index'][bad[0]][1]} values "
+                         f"but range {addr} has {size} cells")
+
+
+def _to_com(values, shape):
+    """
+    Shape a row of values as a tuple of tuples of native Python floats.
+
+    pywin32 marshals this straight into a 2-D SAFEARRAY matching the range;
+    lists, ndarrays and numpy scalars take slower conversion paths.
+    """
+    rows, cols = shape
+    vals = values.tolist() if hasattr(values, "tolist") else list(values)
+    return tuple(tuple(vals[r * cols:(r + 1) * cols]) for r in range(rows))
+
+
+def worker_loop(worker_id, conn,
                 model_path, output_dir, n_sims,
                 worksheet_name="Inputs", rng_assump_addr="I7:Z7",
                 rng_policy_addr="I3:T3", rng_out_addr="U11:V11",
-                max_retries=3, retry_delay=1.0, retry_backoff=2.0):
+                max_retries=3, retry_delay=1.0, retry_backoff=2.0,
+                output_format="csv", assumptions_spec=None, policies_spec=None,
+                rng_out_table_addr=None, max_policies=None, calc_scope="application",
+                batch_macro=None, calc_iteration=None, cpu_set=None, high_priority=False,
+                early_binding=False):
 
     logger.info(f"Worker {worker_id} initializing")
+    if output_format == "npy":
+        write_policy, output_ext = write_policy_npy, ".npy"
+    else:
+        write_policy, output_ext = write_policy_csv, ".csv"
     worker_start = time.time()
     
-    pythoncom.CoInitialize()
+    try:
+        pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+        com_sta = False
+    except pythoncom.com_error:
+        # Thread is already in a single-threaded apartment
+        pythoncom.CoInitialize()
+        com_sta = True
     excel = None
     wb = None
-    
+    ws = rng_assump = rng_policy = rng_out = rng_out_table = calculate = None
+    assumptions_shm = policies_shm = None
+    assumptions_flat = policies_flat = None
+    io_pool = None
+
+    def close_excel():
+        nonlocal excel, wb
+        if wb is not None:
+            try:
+                wb.Close(SaveChanges=False)
+            except Exception as e:
+                logger.warning(f"Worker {worker_id} error closing workbook: {e}")
+        if excel is not None:
+            try:
+                excel.Quit()
+            except Exception as e:
+                logger.warning(f"Worker {worker_id} error quitting Excel: {e}")
+        wb = excel = None
+
     try:
-        excel = win32com.client.DispatchEx("Excel.Application")
-        excel.Visible = False
-        excel.DisplayAlerts = False
-        excel.EnableEvents = False
-        excel.ScreenUpdating = False
-        logger.debug(f"Worker {worker_id} created Excel application")
-
-        # Open workbook with retry
-        max_open_retries = 3
-        for attempt in range(1, max_open_retries + 1):
+        if cpu_set is not None or high_priority:
             try:
-                wb = excel.Workbooks.Open(model_path)
-                logger.debug(f"Worker {worker_id} opened workbook")
-                break
+                _tune_process(os.getpid(), cpu_set, high_priority)
             except Exception as e:
-                if attempt < max_open_retries:
-                    logger.warning(f"Worker {worker_id} failed to open workbook (attempt {attempt}): {e}")
-                    time.sleep(1.0 * attempt)
-                else:
-                    raise
-        
-        # Set calculation mode with error handling
-        try:
-            excel.Calculation = -4135  # xlManual
-            logger.debug(f"Worker {worker_id} set manual calculation mode")
-        except Exception as e:
-            logger.warning(f"Worker {worker_id}: couldn't set Excel Calculation mode: {e}")
+                logger.warning(f"Worker {worker_id} couldn't set process affinity/priority: {e}")
+
+        # Attach to the read-only input tables published by the scheduler
+        assumptions_shm, assumptions_flat = attach_shared_table(assumptions_spec)
+        policies_shm, policies_flat = attach_shared_table(policies_spec)
+
+        def open_excel():
+            """Start Excel, open the workbook and (re)bind the range handles used below."""
+            nonlocal excel, wb, ws, rng_assump, rng_policy, rng_out, rng_out_table, calculate
+
+            excel = win32com.client.DispatchEx("Excel.Application")
+            if early_binding:
+                # Early-bound wrapper around this private instance (EnsureDispatch on the
+                # ProgID would attach to a shared Excel instead). Only when the parent has
+                # generated the module, so workers never write the gen_py cache themselves
+                try:
+                    excel = win32com.client.gencache.EnsureDispatch(excel._oleobj_)
+                except Exception as e:
+                    logger.debug(f"Worker {worker_id} using late-bound Excel: {e}")
+            if cpu_set is not None or high_priority:
+                # Excel runs in its own EXCEL.EXE process, which the scheduler can't see
+                try:
+                    _, excel_pid = win32process.GetWindowThreadProcessId(excel.Hwnd)
+                    _tune_process(excel_pid, cpu_set, high_priority)
+                    logger.debug(f"Worker {worker_id} tuned Excel process {excel_pid} (cpus={cpu_set}, high_priority={high_priority})")
+                except Exception as e:
+                    logger.warning(f"Worker {worker_id} couldn't set Excel process affinity/priority: {e}")
+            xl_calculation_manual = getattr(win32com.client.constants, "xlCalculationManual", -4135)
+            excel.Visible = False
+            excel.DisplayAlerts = False
+            excel.EnableEvents = False
+            excel.ScreenUpdating = False
+            logger.debug(f"Worker {worker_id} created Excel application")
+
+            # Open workbook with retry; a missing file isn't transient, so don't retry it
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model file not found: {model_path}")
+            max_open_retries = 3
+            for attempt in range(1, max_open_retries + 1):
+                try:
+                    # Read-only, no link refresh or MRU entry: inputs are written to cells
+                    # but the copy is never saved
+                    wb = excel.Workbooks.Open(Filename=os.fspath(model_path), UpdateLinks=0, ReadOnly=True,
+                                              IgnoreReadOnlyRecommended=True, Notify=False, AddToMru=False)
+                    logger.debug(f"Worker {worker_id} opened workbook")
+                    break
+                except Exception as e:
+                    if attempt < max_open_retries:
+                        logger.warning(f"Worker {worker_id} failed to open workbook (attempt {attempt}): {e}")
+                        time.sleep(1.0 * attempt)
+                    else:
+                        raise
+
+            # Set calculation mode with error handling
+            try:
+                excel.Calculation = xl_calculation_manual
+                logger.debug(f"Worker {worker_id} set manual calculation mode")
+            except Exception as e:
+                logger.warning(f"Worker {worker_id}: couldn't set Excel Calculation mode: {e}")
+
+            # Application settings that add hidden work to each Calculate; set after the
+            # workbook opens since Excel takes Iteration from the first workbook loaded.
+            # Add-ins are left alone: automation instances don't load them, and
+            # uninstalling them would change the user's Excel configuration.
+            app_settings = [
+                ("CalculateBeforeSave", False),
+                ("CalculationInterruptKey", getattr(win32com.client.constants, "xlNoKey", 0)),  # don't poll the keyboard
+                ("AskToUpdateLinks", False),
+                ("PrintCommunication", False),
+                ("Interactive", False),  # ignore keyboard/mouse input to the hidden instance
+            ]
+            if calc_iteration is not None:
+                app_settings.append(("Iteration", bool(calc_iteration)))
+            for prop, value in app_settings:
+                try:
+                    setattr(excel, prop, value)
+                except Exception as e:
+                    logger.debug(f"Worker {worker_id}: couldn't set Excel {prop}: {e}")
 
-        ws = wb.Worksheets(worksheet_name)
-        rng_assump = ws.Range(rng_assump_addr)
-        rng_policy = ws.Range(rng_policy_addr)
-        rng_out    = ws.Range(rng_out_addr)
+            ws = wb.Worksheets(worksheet_name)
+            rng_assump = ws.Range(rng_assump_addr)
+            rng_policy = ws.Range(rng_policy_addr)
+            rng_out    = ws.Range(rng_out_addr)
+            rng_out_table = None
+            if rng_out_table_addr:
+                rng_out_table = ws.Range(rng_out_table_addr)
+                if rng_out_table.Rows.Count == 1:
+                    # Only the first row given: the block extends n_sims rows down
+                    rng_out_table = rng_out_table.Resize(n_sims, rng_out_table.Columns.Count)
+
+            # Resolved once; the per-sim loop calls it n_sims times per policy.
+            # "sheet" recalculates only the model sheet; "range" recalculates only the
+            # cells of the output range itself (not their precedents), so it's only
+            # correct when those formulas read the inputs directly. "full" recalculates
+            # every formula whether dirty or not.
+            if calc_scope == "full":
+                calculate = excel.CalculateFull
+            elif calc_scope == "sheet":
+                ws.EnableCalculation = True
+                calculate = ws.Calculate
+            elif calc_scope == "range":
+                calculate = (rng_out_table if rng_out_table is not None else rng_out).Calculate
+            else:
+                calculate = excel.Calculate
+
+        def recover_excel():
+            """Replace a failed Excel session with a fresh one and re-apply the current scenario."""
+            close_excel()
+            open_excel()
+            if current_scenario is not None:
+                rng_assump.Value2 = assump_buf  # still holds the current scenario
+            logger.info(f"Worker {worker_id} reopened workbook")
+            send_tick(conn)  # the reopen doesn't count against the policy's timeout
+
+        open_excel()
+
+        # Writes must match the range shape exactly so Excel never resizes or pads with #N/A
+        assump_shape = _range_shape(rng_assump)
+        policy_shape = _range_shape(rng_policy)
+        _check_table_shape(assumptions_spec, assump_shape, "Assumptions for scenarios", rng_assump_addr)
+        _check_table_shape(policies_spec, policy_shape, "Policies", rng_policy_addr)
+
+        # Typed double SAFEARRAY wrappers, reused for every write: pywin32 packs the
+        # values straight into VT_R8 instead of inspecting and boxing each cell as a VARIANT
+        assump_buf = win32com.client.VARIANT(pythoncom.VT_ARRAY | pythoncom.VT_R8, ())
+        policy_buf = win32com.client.VARIANT(pythoncom.VT_ARRAY | pythoncom.VT_R8, ())
+
+        # Optional data table with one row per simulation: a single Calculate fills
+        # every row, so the whole policy is one recalculation and one range read
+        if rng_out_table is not None:
+            table_rows = rng_out_table.Rows.Count
+            if table_rows != n_sims:
+                raise ValueError(f"rng_out_table {rng_out_table_addr} has {table_rows} rows, expected n_sims={n_sims}")
+            logger.debug(f"Worker {worker_id} using output data table {rng_out_table_addr}")
         
+        if batch_macro:
+            logger.debug(f"Worker {worker_id} using batch macro {batch_macro}")
+        else:
+            logger.debug(f"Worker {worker_id} calculation scope: {calc_scope}")
+
+        # A 1-row output range comes back as ((x, y, ...),): fill a preallocated
+        # float64 buffer row by row instead of growing a list of tuples
+        out_rows, out_cols = _range_shape(rng_out)
+        array_outputs = out_rows == 1 and out_cols >= 2
+
+        # Result files are written on a background thread so the next policy's
+        # calculation overlaps the previous policy's file write (COM calls release the GIL)
+        io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"worker{worker_id}-io")
+        pending_writes = []
+
+        # Checked once: f-string arguments are built even when DEBUG is off,
+        # which adds up in the per-policy and per-sim paths below
+        debug = logger.isEnabledFor(logging.DEBUG)
+
         init_elapsed = time.time() - worker_start
         logger.info(f"Worker {worker_id} ready to process jobs (init time: {init_elapsed:.2f}s)")
+        # Excel startup doesn't count against the first policy's timeout
+        send_tick(conn)
 
         current_scenario = None
+        policies_run = 0
 
         while True:
-            msg = task_queue.get()
+            try:
+                msg = recv_msg(conn)
+            except EOFError:
+                logger.warning(f"Worker {worker_id} lost connection to scheduler")
+                break
 
             if msg["type"] == "SHUTDOWN":
                 logger.debug(f"Worker {worker_id} received shutdown signal")
@@ -70,16 +331,20 @@ def worker_loop(worker_id, task_queue, result_queue,
 
             if msg["type"] == "SET_SCENARIO":
                 current_scenario = msg["scenario_id"]
+                # Created once per scenario switch; writers skip their own makedirs
+                scenario_dir = os.path.join(output_dir, f"scenario_{current_scenario}")
+                ensure_dir(scenario_dir)
+                file_prefix = f"{scenario_dir}{os.sep}policy_"
                 
-                def set_scenario():
-                    rng_assump.Value = msg["assumptions"]
-                
+                assump_buf.value = _to_com(table_row(assumptions_flat, assumptions_spec, current_scenario), assump_shape)
+
                 try:
                     # Retry setting scenario
                     for attempt in range(1, max_retries + 1):
                         try:
-                            set_scenario()
-                            logger.debug(f"Worker {worker_id} set scenario {current_scenario}")
+                            rng_assump.Value2 = assump_buf
+                            if debug:
+                                logger.debug(f"Worker {worker_id} set scenario {current_scenario}")
                             break
                         except Exception as e:
                             if attempt < max_retries:
@@ -87,112 +352,140 @@ def worker_loop(worker_id, task_queue, result_queue,
                                 time.sleep(retry_delay * (retry_backoff ** (attempt - 1)))
                             else:
                                 raise
-                    
-                    result_queue.put({
-                        "worker": worker_id,
-                        "event": "SCENARIO_SET",
-                        "scenario": current_scenario
-                    })
+                    # No acknowledgement: the next POLICY_DONE_BATCH reports the scenario
                 except Exception as e:
                     logger.error(f"Worker {worker_id} failed to set scenario: {e}")
                     raise
 
-            elif msg["type"] == "RUN_POLICY":
-                policy_id = msg["policy_id"]
-                job_start = time.time()
+            elif msg["type"] == "RUN_POLICY_BATCH":
+                policy_ids = msg["policy_ids"]
+                last_policy = policy_ids[-1]
+                for policy_id in policy_ids:
+                    job_start = time.time()
                 
-                def set_policy():
-                    rng_policy.Value = msg["policy_data"]
-                
-                try:
-                    # Retry setting policy
-                    for attempt in range(1, max_retries + 1):
-                        try:
-                            set_policy()
-                            logger.debug(f"Worker {worker_id} set policy {policy_id}")
-                            break
-                        except Exception as e:
-                            if attempt < max_retries:
-                                logger.warning(f"Worker {worker_id} failed to set policy (attempt {attempt}): {e}")
-                                time.sleep(retry_delay * (retry_backoff ** (attempt - 1)))
-                            else:
-                                raise
-                    
-                    outputs = []
-                    calc_start = time.time()
-                    for sim_num in range(n_sims):
-                        # Retry logic for individual simulation
-                        calc_success = False
+                    policy_buf.value = _to_com(table_row(policies_flat, policies_spec, policy_id), policy_shape)
+
+                    try:
+                        # Retry at policy granularity: the sim loop itself carries no
+                        # try/except; a COM failure reopens the workbook and reruns the policy
                         for attempt in range(1, max_retries + 1):
                             try:
-                                excel.Calculate()
-                                output_value = rng_out.Value
-                                logger.debug(f"Worker {worker_id} sim {sim_num} output type: {type(output_value)}, value: {output_value}")
-                                outputs.append(output_value)
-                                calc_success = True
+                                rng_policy.Value2 = policy_buf
+                                if debug:
+                                    logger.debug(f"Worker {worker_id} set policy {policy_id}")
+
+                                calc_start = time.time()
+                                if batch_macro:
+                                    # The macro runs all n_sims recalculations inside Excel and
+                                    # returns an n_sims x k array: one COM call per policy
+                                    outputs = np.asarray(excel.Run(batch_macro, n_sims), dtype=np.float64)
+                                    if outputs.ndim != 2 or len(outputs) != n_sims:
+                                        raise ValueError(f"{batch_macro} returned shape {outputs.shape}, "
+                                                         f"expected {n_sims} rows")
+                                elif rng_out_table is not None:
+                                    calculate()
+                                    outputs = np.asarray(rng_out_table.Value2, dtype=np.float64)
+                                elif array_outputs:
+                                    # New buffer per policy: the previous one may still be queued for writing
+                                    outputs = np.empty((n_sims, out_cols), dtype=np.float64)
+                                    for sim_num in range(n_sims):
+                                        calculate()
+                                        output_value = rng_out.Value2
+                                        if debug:
+                                            logger.debug("Worker %d sim %d output: %r", worker_id, sim_num, output_value)
+                                        outputs[sim_num] = output_value[0]
+                                else:
+                                    outputs = []
+                                    for sim_num in range(n_sims):
+                                        calculate()
+                                        output_value = rng_out.Value2
+                                        if debug:
+                                            logger.debug("Worker %d sim %d output: %r", worker_id, sim_num, output_value)
+                                        outputs.append(output_value)
                                 break
+                            except (TypeError, ValueError) as e:
+                                # Text in an output cell or a bad macro result: reopening Excel won't change it
+                                raise RuntimeError(f"Policy {policy_id} produced invalid output: {e}")
                             except Exception as e:
-                                if attempt < max_retries:
-                                    logger.warning(f"Worker {worker_id} sim {sim_num} failed (attempt {attempt}/{max_retries}): {e}")
-                                    time.sleep(retry_delay * (retry_backoff ** (attempt - 1)))
-                                else:
-                                    logger.error(f"Worker {worker_id} sim {sim_num} failed after {max_retries} attempts: {e}")
-                        
-                        if not calc_success:
-                            raise RuntimeError(f"Simulation {sim_num} failed after {max_retries} retry attempts")
-                    
-                    calc_elapsed = time.time() - calc_start
-
-                    out_file = (
-                        f"{output_dir}/scenario_{current_scenario}/"
-                        f"policy_{policy_id}.csv"
-                    )
-                    write_start = time.time()
-                    write_policy_csv(out_file, outputs)
-                    write_elapsed = time.time() - write_start
-                    
-                    logger.debug(f"Worker {worker_id} saved policy {policy_id} results")
-
-                    job_elapsed = time.time() - job_start
-                    logger.debug(f"Worker {worker_id} job stats - "
-                               f"policy set: init, calculations: {calc_elapsed:.2f}s, "
-                               f"file write: {write_elapsed:.2f}s, total: {job_elapsed:.2f}s")
-
-                    result_queue.put({
-                        "worker": worker_id,
-                        "event": "POLICY_DONE",
-                        "scenario": current_scenario,
-                        "policy": policy_id
-                    })
-                except Exception as e:
-                    logger.error(f"Worker {worker_id} failed running policy {policy_id}: {e}")
-                    raise
+                                if attempt == max_retries:
+                                    raise RuntimeError(f"Policy {policy_id} failed after {max_retries} attempts: {e}")
+                                logger.warning(f"Worker {worker_id} policy {policy_id} failed "
+                                               f"(attempt {attempt}/{max_retries}), reopening workbook: {e}")
+                                time.sleep(retry_delay * (retry_backoff ** (attempt - 1)))
+                                recover_excel()
+
+                        calc_elapsed = time.time() - calc_start
+
+                        out_file = f"{file_prefix}{policy_id}{output_ext}"
+                        pending_writes.append(io_pool.submit(write_policy, out_file, outputs, False))
+                        if debug:
+                            job_elapsed = time.time() - job_start
+                            logger.debug(f"Worker {worker_id} queued policy {policy_id} results - "
+                                       f"calculations: {calc_elapsed:.2f}s, total: {job_elapsed:.2f}s")
+                        if policy_id != last_policy:
+                            # One-byte progress frame; the batch's last policy is reported by POLICY_DONE_BATCH
+                            send_tick(conn)
+                    except Exception as e:
+                        logger.error(f"Worker {worker_id} failed running policy {policy_id}: {e}")
+                        raise
+
+                # Every file in the batch is on disk before it's reported done;
+                # result() re-raises any write error here
+                write_start = time.time()
+                for fut in pending_writes:
+                    fut.result()
+                pending_writes.clear()
+                if debug:
+                    logger.debug(f"Worker {worker_id} waited {time.time() - write_start:.2f}s for result files")
+
+                # Recycle the Excel session after max_policies so leaks can't build up;
+                # the scheduler starts a fresh worker in this slot when it sees "retire"
+                policies_run += len(policy_ids)
+                retire = bool(max_policies) and policies_run >= max_policies
+
+                send_msg(conn, {
+                    "worker": worker_id,
+                    "event": "POLICY_DONE_BATCH",
+                    "scenario": current_scenario,
+                    "policies": policy_ids,
+                    "retire": retire
+                })
+
+                if com_sta:
+                    # Drain queued window messages once per batch; MTA threads have no queue
+                    pythoncom.PumpWaitingMessages()
+
+                if retire:
+                    logger.info(f"Worker {worker_id} retiring after {policies_run} policies")
+                    break
 
     except Exception as e:
         traceback.print_exc()
         logger.error(f"Worker {worker_id} encountered fatal error: {e}", exc_info=True)
         try:
-            result_queue.put({
+            send_msg(conn, {
                 "worker": worker_id,
                 "event": "ERROR",
                 "error": str(e)
             })
         except Exception as q_err:
-            logger.error(f"Worker {worker_id} couldn't put error in queue: {q_err}")
+            logger.error(f"Worker {worker_id} couldn't send error to scheduler: {q_err}")
 
     finally:
-        if wb is not None:
-            try:
-                wb.Close(SaveChanges=False)
-            except Exception as e:
-                logger.warning(f"Worker {worker_id} error closing workbook: {e}")
-        
-        if excel is not None:
-            try:
-                excel.Quit()
-            except Exception as e:
-                logger.warning(f"Worker {worker_id} error quitting Excel: {e}")
-        
+        if io_pool is not None:
+            io_pool.shutdown(wait=True)
+
+        close_excel()
+
+        # Drop views before closing the shared blocks
+        assumptions_flat = policies_flat = None
+        for shm in (assumptions_shm, policies_shm):
+            if shm is not None:
+                try:
+                    release_shared_table(shm)
+                except Exception as e:
+                    logger.warning(f"Worker {worker_id} error releasing shared table: {e}")
+
         try:
             pythoncom.CoUninitialize()
         except Exception as e: